@@ -0,0 +1,252 @@
+# app/admission.py
+import asyncio
+import itertools
+import json
+import math
+import os
+import time
+from typing import Dict, List, Tuple, AsyncIterator, Optional
+
+from fastapi import HTTPException
+
+from app.config import Config
+
+# Lower values are admitted first
+PRIORITY_CACHE_HIT = 0
+PRIORITY_COLD = 1
+
+# Published worker stats older than this are treated as belonging to a dead worker
+STATS_MAX_AGE = 5.0
+
+
+class AdmissionTicket:
+    def __init__(self, controller: "AdmissionController", tenant_id: str):
+        """
+        A slot held by an admitted request. It must be released exactly once when the request finishes.
+        """
+        self.controller = controller
+        self.tenant_id = tenant_id
+        self.started_at = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        """
+        Return the slot to the controller. Safe to call more than once.
+        """
+        if self._released:
+            return
+        self._released = True
+        self.controller._release(self)
+
+    async def guard(self, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Yield from a streaming response body and release the slot once it finishes or the client disconnects.
+        """
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            self.release()
+
+
+class AdmissionController:
+    def __init__(self,
+                 max_in_flight: int = Config.per_worker(Config.ADMISSION_MAX_IN_FLIGHT),
+                 max_in_flight_per_tenant: int = Config.per_worker(Config.ADMISSION_MAX_IN_FLIGHT_PER_TENANT),
+                 max_queue: int = Config.per_worker(Config.ADMISSION_MAX_QUEUE),
+                 max_wait: float = Config.ADMISSION_MAX_WAIT):
+        """
+        Initializes the admission controller guarding expensive request handling in this worker process.
+
+        The defaults are this worker's share of the machine-wide limits in Config.
+
+        Args:
+            max_in_flight: The maximum number of requests processed at once.
+            max_in_flight_per_tenant: The maximum number of requests processed at once for a single tenant.
+            max_queue: The maximum number of requests waiting for a slot; beyond this requests are rejected.
+            max_wait: Seconds a request may wait for a slot before it is rejected.
+        """
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_tenant = max_in_flight_per_tenant
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self._in_flight = 0
+        self._tenant_in_flight: Dict[str, int] = {}
+        # (priority, sequence, tenant_id, future) ordered by priority, then arrival
+        self._queue: List[Tuple[int, int, str, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        # Moving average of how long an admitted request holds its slot, used to estimate waits.
+        # None until the first request completes, so no request is rejected on a guess.
+        self._avg_service_time: Optional[float] = None
+
+        self.admitted_total = 0
+        self.rejected_total: Dict[str, int] = {"queue_full": 0, "deadline": 0, "timeout": 0}
+
+    def estimated_wait(self, position: int) -> float:
+        """
+        Estimate how long a request at the given queue position will wait for a slot, in seconds.
+        """
+        if self._avg_service_time is None:
+            return 0.0
+        return (position + 1) * self._avg_service_time / self.max_in_flight
+
+    async def acquire(self, tenant_id: str, priority: int = PRIORITY_COLD) -> AdmissionTicket:
+        """
+        Wait for a processing slot for the tenant, or reject the request with 429 if it cannot be served in time.
+
+        Args:
+            tenant_id: The tenant making the request.
+            priority: PRIORITY_CACHE_HIT for requests expected to be served from cache, otherwise PRIORITY_COLD.
+
+        Returns:
+            An AdmissionTicket that must be released when the request finishes.
+        """
+        # Every queued waiter is blocked on a limit, so a request that has capacity jumps no one.
+        if self._has_capacity(tenant_id):
+            return self._admit(tenant_id)
+
+        position = sum(1 for queued in self._queue if queued[0] <= priority)
+        if len(self._queue) >= self.max_queue:
+            self._reject("queue_full", self.estimated_wait(position))
+        if self.estimated_wait(position) > self.max_wait:
+            self._reject("deadline", self.estimated_wait(position))
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self._sequence), tenant_id, future)
+        self._queue.append(waiter)
+
+        try:
+            await asyncio.wait({future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not future.done():
+            self._abandon(waiter)
+            self._reject("timeout", self.estimated_wait(position))
+        return future.result()
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Return a snapshot of admission counters for health checks and metrics.
+        """
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._queue),
+            "admitted_total": self.admitted_total,
+            "rejected_total": dict(self.rejected_total),
+        }
+
+    def _has_capacity(self, tenant_id: str) -> bool:
+        return (self._in_flight < self.max_in_flight
+                and self._tenant_in_flight.get(tenant_id, 0) < self.max_in_flight_per_tenant)
+
+    def _admit(self, tenant_id: str) -> AdmissionTicket:
+        self._in_flight += 1
+        self._tenant_in_flight[tenant_id] = self._tenant_in_flight.get(tenant_id, 0) + 1
+        self.admitted_total += 1
+        return AdmissionTicket(self, tenant_id)
+
+    def _dispatch(self) -> None:
+        # Admit waiters by priority; a waiter blocked on its tenant limit does not hold up other tenants.
+        for waiter in sorted(self._queue):
+            if self._in_flight >= self.max_in_flight:
+                break
+            _, _, tenant_id, future = waiter
+            if self._has_capacity(tenant_id):
+                self._queue.remove(waiter)
+                future.set_result(self._admit(tenant_id))
+
+    def _abandon(self, waiter: Tuple[int, int, str, asyncio.Future]) -> None:
+        future = waiter[3]
+        if waiter in self._queue:
+            self._queue.remove(waiter)
+            future.cancel()
+        elif future.done() and not future.cancelled():
+            # Admitted just as the caller gave up
+            future.result().release()
+
+    def _release(self, ticket: AdmissionTicket) -> None:
+        self._in_flight -= 1
+        remaining = self._tenant_in_flight[ticket.tenant_id] - 1
+        if remaining:
+            self._tenant_in_flight[ticket.tenant_id] = remaining
+        else:
+            del self._tenant_in_flight[ticket.tenant_id]
+        service_time = time.monotonic() - ticket.started_at
+        if self._avg_service_time is None:
+            self._avg_service_time = service_time
+        else:
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * service_time
+        self._dispatch()
+
+    def _reject(self, reason: str, retry_after: float) -> None:
+        self.rejected_total[reason] += 1
+        raise HTTPException(
+            status_code=429,
+            detail="Server is busy, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+# Shared controller for the process
+admission_controller = AdmissionController()
+
+
+def _stats_path(pid: int) -> str:
+    return os.path.join(Config.METRICS_DIR, f"{pid}.json")
+
+
+def publish_stats(controller: AdmissionController = admission_controller) -> None:
+    """
+    Write this worker's admission counters where the other workers can read them.
+    """
+    os.makedirs(Config.METRICS_DIR, exist_ok=True)
+    path = _stats_path(os.getpid())
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(controller.stats(), f)
+    os.replace(f"{path}.tmp", path)
+
+
+def unpublish_stats() -> None:
+    """
+    Remove this worker's published counters on shutdown.
+    """
+    try:
+        os.remove(_stats_path(os.getpid()))
+    except FileNotFoundError:
+        pass
+
+
+def aggregate_stats(controller: AdmissionController = admission_controller) -> Dict[str, object]:
+    """
+    Sum admission counters over all live workers on this machine, using live values for this worker.
+    """
+    total = controller.stats()
+    own = os.path.basename(_stats_path(os.getpid()))
+    names = os.listdir(Config.METRICS_DIR) if os.path.isdir(Config.METRICS_DIR) else []
+    for name in names:
+        if name == own or not name.endswith(".json"):
+            continue
+        path = os.path.join(Config.METRICS_DIR, name)
+        try:
+            if time.time() - os.path.getmtime(path) > STATS_MAX_AGE:
+                continue
+            with open(path) as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for counter in ("in_flight", "queue_depth", "admitted_total"):
+            total[counter] += stats.get(counter, 0)
+        for reason, count in stats.get("rejected_total", {}).items():
+            total["rejected_total"][reason] = total["rejected_total"].get(reason, 0) + count
+    return total
+
+
+async def publish_stats_forever(interval: float = 1.0) -> None:
+    """
+    Publish this worker's counters periodically until cancelled.
+    """
+    while True:
+        await asyncio.to_thread(publish_stats)
+        await asyncio.sleep(interval)
@@ -0,0 +1,183 @@
+# app/answer_cache.py
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional, Iterable, Set, AsyncIterator, Any
+
+from app.config import Config
+
+# (tenant_id, model, normalized query, FAQ ids, digest of the FAQ contents)
+AnswerKey = Tuple[str, str, str, Tuple[str, ...], str]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a user query so trivially different phrasings share a cache entry.
+
+    Args:
+        query: The raw user query.
+
+    Returns:
+        The query lowercased, with surrounding punctuation and repeated whitespace removed.
+    """
+    return " ".join(query.lower().strip(" \t\n?!.").split())
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = Config.ANSWER_CACHE_MAX_ENTRIES, ttl: float = Config.ANSWER_CACHE_TTL):
+        """
+        Initializes an LRU cache of generated LLM answers with a time-to-live.
+
+        Args:
+            max_entries: The maximum number of answers kept before the least recently used is evicted.
+            ttl: Seconds a cached answer stays valid.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[AnswerKey, Tuple[float, List[str]]]" = OrderedDict()
+        # (tenant_id, faq_id) -> keys of answers generated from that FAQ, for invalidation
+        self._by_faq: Dict[Tuple[str, str], Set[AnswerKey]] = {}
+        # (tenant_id, model, normalized query) -> keys, to predict a hit before retrieval runs
+        self._by_query: Dict[Tuple[str, str, str], Set[AnswerKey]] = {}
+
+    @staticmethod
+    def make_key(tenant_id: str, model: str, query: str, similar_faqs: List[Dict[str, Any]]) -> AnswerKey:
+        """
+        Build the cache key for an answer.
+
+        The key includes a digest of the retrieved FAQ questions and answers. An edited FAQ therefore
+        yields a new key in every worker and on every machine, with no invalidation message needed.
+
+        Args:
+            tenant_id: The tenant the query belongs to.
+            model: The LLM model generating the answer.
+            query: The user query.
+            similar_faqs: The FAQs retrieved as context for the answer, each with an "id".
+
+        Returns:
+            A hashable key identifying the answer.
+        """
+        digest = hashlib.sha256()
+        for faq in similar_faqs:
+            digest.update(f"{faq['id']}\0{faq['question']}\0{faq['answer']}\0".encode())
+        faq_ids = tuple(faq["id"] for faq in similar_faqs)
+        return tenant_id, model, normalize_query(query), faq_ids, digest.hexdigest()
+
+    def get(self, key: AnswerKey) -> Optional[List[str]]:
+        """
+        Return the cached SSE events for key, or None if missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, events = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return events
+
+    def has_query(self, tenant_id: str, model: str, query: str) -> bool:
+        """
+        Return True if some live answer to this query is cached, whatever FAQs it was generated from.
+
+        This is only a hint: the retrieved FAQs may differ. Expired answers found along the way are dropped.
+        """
+        now = time.monotonic()
+        for key in list(self._by_query.get((tenant_id, model, normalize_query(query)), ())):
+            if self._entries[key][0] > now:
+                return True
+            self._remove(key)
+        return False
+
+    def put(self, key: AnswerKey, events: List[str]) -> None:
+        """
+        Cache the SSE events of a fully generated answer, evicting the least recently used entries if full.
+        """
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, events)
+        tenant_id, model, query, faq_ids, _ = key
+        self._by_query.setdefault((tenant_id, model, query), set()).add(key)
+        for faq_id in faq_ids:
+            self._by_faq.setdefault((tenant_id, faq_id), set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_faqs(self, tenant_id: str, faq_ids: Iterable[str]) -> None:
+        """
+        Drop every cached answer that was generated with any of the given FAQs as context.
+
+        Keys already change when FAQ contents change, so this only frees memory in this process.
+
+        Args:
+            tenant_id: The tenant owning the FAQs.
+            faq_ids: The ids of the FAQs that changed.
+        """
+        for faq_id in faq_ids:
+            for key in self._by_faq.pop((tenant_id, faq_id), set()):
+                self._remove(key)
+
+    def invalidate_tenant(self, tenant_id: str) -> None:
+        """
+        Drop every cached answer for a tenant.
+        """
+        for key in [key for key in self._entries if key[0] == tenant_id]:
+            self._remove(key)
+
+    def dump(self) -> List[Dict[str, object]]:
+        """
+        Export live entries with their remaining TTL, least recently used first, for snapshotting.
+        """
+        now = time.monotonic()
+        return [
+            {"key": [tenant_id, model, query, list(faq_ids), digest], "ttl": expires_at - now, "events": events}
+            for (tenant_id, model, query, faq_ids, digest), (expires_at, events) in self._entries.items()
+            if expires_at > now
+        ]
+
+    def load(self, entries: List[Dict[str, object]]) -> None:
+        """
+        Import entries produced by `dump`, keeping their remaining TTL.
+        """
+        for entry in entries:
+            tenant_id, model, query, faq_ids, digest = entry["key"]
+            key = (tenant_id, model, query, tuple(faq_ids), digest)
+            self.put(key, entry["events"])
+            self._entries[key] = (time.monotonic() + min(entry["ttl"], self.ttl), entry["events"])
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_faq.clear()
+        self._by_query.clear()
+
+    def _remove(self, key: AnswerKey) -> None:
+        if self._entries.pop(key, None) is None:
+            return
+        tenant_id, model, query, faq_ids, _ = key
+        self._discard(self._by_query, (tenant_id, model, query), key)
+        for faq_id in faq_ids:
+            self._discard(self._by_faq, (tenant_id, faq_id), key)
+
+    @staticmethod
+    def _discard(index: Dict[tuple, Set[AnswerKey]], index_key: tuple, key: AnswerKey) -> None:
+        keys = index.get(index_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[index_key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+async def replay_events(events: List[str]) -> AsyncIterator[str]:
+    """
+    Yield cached SSE events immediately, without any delay.
+    """
+    for event in events:
+        yield event
+
+
+# Shared cache for the process
+answer_cache = AnswerCache()
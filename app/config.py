@@ -5,4 +5,50 @@ class Config:
     API_KEY = os.getenv("API_KEY", "default_api_key")
     EMBEDDING_MODEL_NAME = "distilbert-base-uncased"
     MAX_FAQ_RESULTS = 5
+
+    # Prompt budgeting for LLM calls
+    LLM_MODEL = os.getenv("LLM_MODEL", "llama3.2:1b")
+    PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER")  # HF tokenizer matching LLM_MODEL; None falls back to an estimate
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2048"))
+    PROMPT_RESPONSE_RESERVE = int(os.getenv("PROMPT_RESPONSE_RESERVE", "256"))
+    PROMPT_FAQ_SHARE = float(os.getenv("PROMPT_FAQ_SHARE", "0.6"))
+    PROMPT_HISTORY_SUMMARY_TOKENS = int(os.getenv("PROMPT_HISTORY_SUMMARY_TOKENS", "128"))
+
+    # Generated answers: off keeps /api/ask returning the top FAQ answer as JSON; on streams LLM answers over SSE
+    LLM_ANSWERS_ENABLED = os.getenv("LLM_ANSWERS_ENABLED", "false").lower() == "true"
+    # Generated-answer cache
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))  # per machine; beyond this, stream the top FAQ answer
+
+    # Admission control for /api/ask. Limits are per machine and split evenly across the uvicorn workers.
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))  # uvicorn reads the same variable for --workers
+    ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "4"))
+    ADMISSION_MAX_IN_FLIGHT_PER_TENANT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT_PER_TENANT", "4"))
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+    ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "10"))  # seconds a request may wait for a slot
+    METRICS_DIR = os.getenv("METRICS_DIR", "/tmp/askme-metrics")  # workers publish their counters here for /metrics
+
+    # Local tenant index and warm-start snapshots
+    LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "false").lower() == "true"  # search locally instead of Pinecone
+    SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")  # on Fly, a mounted volume (see [mounts] in fly.toml)
+    SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "86400"))  # seconds before a snapshot is rebuilt from faqs
+    LOCAL_INDEX_REFRESH_INTERVAL = float(os.getenv("LOCAL_INDEX_REFRESH_INTERVAL", "60"))  # seconds between checks for FAQ changes
+    DB_BACKEND = os.getenv("DB_BACKEND", "mongo")  # "mongo" or "sqlite"
+
+    # MongoDB backend
+    MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+    MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "multitenant_chatbot")
+    MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "2"))
+    MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "60000"))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+    MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "10000"))
+    MONGODB_BATCH_SIZE = int(os.getenv("MONGODB_BATCH_SIZE", "500"))
     # More configurations as needed
+
+    @staticmethod
+    def per_worker(limit: int) -> int:
+        # A worker always gets at least one slot, so tiny limits round up
+        return max(1, limit // Config.WEB_CONCURRENCY)
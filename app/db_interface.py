@@ -13,7 +13,11 @@ class DBInterface(ABC):
         pass
 
     @abstractmethod
-    async def get_faqs(self, tenant_id: int) -> List[Dict[str, str]]:
+    async def get_faqs(self, tenant_id: int, include_embeddings: bool = True) -> List[Dict[str, str]]:
+        pass
+
+    @abstractmethod
+    async def get_faq_fingerprint(self, tenant_id: int) -> str:
         pass
 
     @abstractmethod
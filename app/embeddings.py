@@ -1,14 +1,21 @@
 import asyncio
 import json
+import logging
 from ollama import AsyncClient
 from pinecone import Pinecone
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import spacy
 from typing import List, Dict
-from app.utils import sanitize_id
+from app.answer_cache import answer_cache, AnswerKey
+from app.config import Config
+from app.prompt_builder import get_prompt_builder
+from app.snapshots import delete_tenant_snapshot
+from app.tenant_index import get_tenant_index, tenant_indexes
+from app.utils import sanitize_id, stream_words
 
+logger = logging.getLogger("uvicorn")
 
 
 
@@ -91,6 +98,14 @@ class EmbeddingsHandler:
         # Insert into Pinecone
         self.pinecone_index.upsert(vectors=faq_vectors,namespace=tenant_id)
 
+        # Answers generated from the previous version of these FAQs are now stale
+        answer_cache.invalidate_faqs(tenant_id, [vector["id"] for vector in faq_vectors])
+
+        # So is the local index; drop it and its snapshot so the next startup rebuilds from faqs.
+        # Other workers notice the missing snapshot on their next refresh_tenant_indexes.
+        tenant_indexes.pop(tenant_id, None)
+        await asyncio.to_thread(delete_tenant_snapshot, tenant_id)
+
     async def find_similar_faqs(self, query: str, tenant_id: str, top_k: int = 3) -> List[Dict[str, str]]:
         """
         Find top similar FAQs for the given query using Pinecone.
@@ -101,16 +116,21 @@ class EmbeddingsHandler:
             top_k: The number of top similar FAQs to retrieve.
 
         Returns:
-            A list of dictionaries containing the most similar FAQs and their scores.
+            A list of dictionaries containing the most similar FAQs, their ids and scores.
         """
         # Preprocess and embed the user query
         processed_query = self.preprocess_text(query)
-        query_embedding = self.embed_text(processed_query).tolist()
+        query_embedding = self.embed_text(processed_query)
+
+        # Serve from the warm local index when one is loaded for the tenant
+        local_index = get_tenant_index(tenant_id) if Config.LOCAL_INDEX_ENABLED else None
+        if local_index is not None:
+            return local_index.search(query_embedding, top_k)
 
         # Query Pinecone using the tenant_id as the namespace
         query_response = self.pinecone_index.query(
             namespace=tenant_id,  # Use tenant_id as the namespace
-            vector=query_embedding,  # Pass the query embedding
+            vector=query_embedding.tolist(),  # Pass the query embedding
             top_k=top_k,  # Number of results to retrieve
             include_metadata=True  # Include metadata in the response
         )
@@ -118,6 +138,7 @@ class EmbeddingsHandler:
         # Extract relevant results
         results = [
             {
+                "id": item["id"],
                 "question": item["metadata"]["question"],
                 "answer": item["metadata"]["answer"],
                 "score": item["score"]  # Similarity score
@@ -129,15 +150,28 @@ class EmbeddingsHandler:
 
 
 class LLMHandler:
+    # Bounds concurrent generations; when all slots are taken the LLM is considered saturated
+    _llm_slots = asyncio.Semaphore(Config.per_worker(Config.LLM_MAX_CONCURRENCY))
+
+    @classmethod
+    def is_saturated(cls) -> bool:
+        """
+        Return True if every LLM slot is busy and a new generation would have to wait.
+        """
+        return cls._llm_slots.locked()
+
     @staticmethod
     def generate_llama_prompt(
             similar_faqs: List[Dict[str, Any]],
             user_query: str,
-            conversation_history: List[Dict[str, str]] = []
+            conversation_history: Optional[List[Dict[str, str]]] = None
     ) -> str:
         """
         Generate a focused prompt for the LLM using FAQs and conversation history for accurate, relevant responses.
 
+        The prompt is kept within the configured token budget: FAQs are reranked by score and truncated,
+        and older conversation history is summarized so that only a recent window is sent verbatim.
+
         Args:
             similar_faqs: A list of similar FAQs based on the user's query.
             user_query: The user's current question.
@@ -146,32 +180,11 @@ class LLMHandler:
         Returns:
             A formatted prompt string to send to the LLM for generating a response.
         """
-        # Concatenate Q&A pairs from similar FAQs to form the context
-        faq_context = "\n\n".join([f"Q: {faq['question']}\nA: {faq['answer']}" for faq in similar_faqs])
+        return get_prompt_builder().build(similar_faqs, user_query, conversation_history)
 
-        # Format the conversation history context
-        conversation_context = "\n".join(
-            [f"{message['role'].capitalize()}: {message['content']}" for message in conversation_history])
-
-        # Structured and targeted prompt
-        prompt = (
-            f"You are a customer support chatbot, designed to give precise, relevant answers based on the provided FAQ. "
-            f"Use the FAQ entries and conversation history below to craft a direct, helpful response to the user's question. "
-            f"If the exact answer isn't in the FAQ, infer the best possible answer or advise on next steps.\n\n"
-
-            f"FAQs:\n{faq_context}\n\n"
-            f"Conversation so far:\n{conversation_context}\n\n"
-
-            f"User question: {user_query}\n\n"
-
-            f"Please provide a clear answer based on the information above. "
-            f"Use a polite, concise tone and avoid unnecessary elaboration."
-        )
-
-        return prompt
-
-    @staticmethod
-    async def stream_llama_response(prompt: str, model: str = "llama3.2:1b", suffix: str = "") -> str:
+    @classmethod
+    async def stream_llama_response(cls, prompt: str, model: str = Config.LLM_MODEL, suffix: str = "",
+                                    cache_key: Optional[AnswerKey] = None, fallback_answer: str = "") -> str:
         """
         Stream LLM response for a given prompt.
 
@@ -179,19 +192,34 @@ class LLMHandler:
             prompt: The prompt to send to the LLM.
             model: The model to use for generating the response.
             suffix: Optional suffix to append to the prompt.
+            cache_key: If given, the complete response is stored in the answer cache under this key.
+            fallback_answer: Streamed instead if the LLM fails before producing any output.
 
         Returns:
             A string containing the streamed response from the LLM.
         """
+        events = []
         try:
             print(prompt)
-            # Assuming AsyncClient.chat is asynchronous
-            async for part in await AsyncClient().chat(
-                    model=model,
-                    messages=[{'role': 'user', 'content': prompt}],
-                    stream=True
-            ):
-                print(json.dumps(part['message']['content']))
-                yield f"data: {json.dumps(part['message']['content'])}\n\n"
+            async with cls._llm_slots:
+                # Assuming AsyncClient.chat is asynchronous
+                async for part in await AsyncClient().chat(
+                        model=model,
+                        messages=[{'role': 'user', 'content': prompt}],
+                        stream=True
+                ):
+                    print(json.dumps(part['message']['content']))
+                    event = f"data: {json.dumps(part['message']['content'])}\n\n"
+                    events.append(event)
+                    yield event
         except Exception as e:
-            yield f"data: Error occurred while streaming: {e}\n\n"
+            logger.error(f"Error occurred while streaming: {str(e)}")
+            # A partial answer cannot be taken back; otherwise send the best FAQ answer rather than the error
+            if not events:
+                async for event in stream_words(fallback_answer, 0):
+                    yield event
+            return
+
+        # Only answers that streamed to completion are cached
+        if cache_key is not None:
+            answer_cache.put(cache_key, events)
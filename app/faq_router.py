@@ -1,17 +1,24 @@
 # app/faq_router.py
 import os
+from typing import List, Dict, Any, AsyncIterator
 
 from fastapi import APIRouter, Depends, HTTPException
 from pinecone import Pinecone
 
+from starlette.background import BackgroundTask
 from starlette.responses import StreamingResponse
 
-from app.embeddings import EmbeddingsHandler
+from app.admission import admission_controller, PRIORITY_CACHE_HIT, PRIORITY_COLD
+from app.answer_cache import answer_cache, replay_events, AnswerCache
+from app.config import Config
+from app.embeddings import EmbeddingsHandler, LLMHandler
 from app.models import QueryRequest, ModelSingleton
 from app.utils import stream_words
 
 router = APIRouter()
 
+DEFAULT_TENANT_ID = "6737dbd77a064a2893c302ad"
+
 
 # Dependency injection for EmbeddingsHandler
 async def get_embeddings_handler() -> EmbeddingsHandler:
@@ -28,17 +35,54 @@ async def get_embeddings_handler() -> EmbeddingsHandler:
 async def query_faq(query: QueryRequest,embeddings_handler: EmbeddingsHandler = Depends(get_embeddings_handler)):
     print(query)
 
-    similar_faqs = await embeddings_handler.find_similar_faqs(query.question,"6737dbd77a064a2893c302ad" )
+    # Likely cache hits are cheap, so they are admitted ahead of cold inference
+    if answer_cache.has_query(DEFAULT_TENANT_ID, Config.LLM_MODEL, query.question):
+        priority = PRIORITY_CACHE_HIT
+    else:
+        priority = PRIORITY_COLD
+    ticket = await admission_controller.acquire(DEFAULT_TENANT_ID, priority)
+
+    try:
+        similar_faqs = await embeddings_handler.find_similar_faqs(query.question, DEFAULT_TENANT_ID)
+
+        print(similar_faqs)
+
+        if not similar_faqs:
+            raise HTTPException(status_code=404, detail="No similar FAQs found")
+
+        if not Config.LLM_ANSWERS_ENABLED:
+            ticket.release()
+            return {"results": similar_faqs[0]["answer"]}
+
+        content = answer_stream(query, similar_faqs)
+    except BaseException:
+        ticket.release()
+        raise
+
+    # The slot is held until the stream ends; the background task covers a stream that never starts
+    return StreamingResponse(
+        content=ticket.guard(content),
+        media_type="text/event-stream",
+        background=BackgroundTask(ticket.release)
+    )
+
+
+def answer_stream(query: QueryRequest, similar_faqs: List[Dict[str, Any]]) -> AsyncIterator[str]:
+    # Answers depend on the conversation, so only history-free questions are cached
+    cache_key = None
+    if not query.conversation_history:
+        cache_key = AnswerCache.make_key(DEFAULT_TENANT_ID, Config.LLM_MODEL, query.question, similar_faqs)
+
+        # Replay a previously generated answer for the same question and retrieved context
+        cached_events = answer_cache.get(cache_key)
+        if cached_events is not None:
+            return replay_events(cached_events)
 
-    print(similar_faqs)
-   
-    if not similar_faqs:
-        raise HTTPException(status_code=404, detail="No similar FAQs found")
+    # Fall back to the best matching FAQ answer rather than queueing behind a saturated LLM
+    if LLMHandler.is_saturated():
+        return stream_words(similar_faqs[0]["answer"], 0)
 
-    # prompt = llm_handler.generate_llama_prompt(similar_faqs, query.question, query.conversation_history)
+    conversation_history = [message.model_dump() for message in query.conversation_history]
+    prompt = LLMHandler.generate_llama_prompt(similar_faqs, query.question, conversation_history)
 
-    # return StreamingResponse(
-    #     content=stream_words(similar_faqs[0]["answer"], 0.2),
-    #     media_type="text/event-stream"
-    # )
-    return {"results": similar_faqs[0]["answer"]}
+    return LLMHandler.stream_llama_response(prompt, cache_key=cache_key, fallback_answer=similar_faqs[0]["answer"])
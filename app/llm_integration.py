@@ -1,24 +1,33 @@
 # app/llm_integration.py
 from transformers import pipeline
 
+from app.prompt_builder import PromptBuilder
+
 # Load model and pipeline
 generator = pipeline("text-generation", model="gpt2")
 
+# Budget FAQ context with GPT-2's own tokenizer and context window
+prompt_builder = PromptBuilder(tokenizer=generator.tokenizer, token_budget=generator.tokenizer.model_max_length)
+
 def get_llm_response(prompt):
-    result = generator(prompt, max_length=150, num_return_sequences=1)
+    # max_new_tokens, unlike max_length, does not count the prompt against the generation limit
+    result = generator(prompt, max_new_tokens=prompt_builder.response_reserve, num_return_sequences=1)
     return result[0]["generated_text"]
 
 
 def construct_prompt(similar_faqs, query):
     # Provide a prelude with the user query
-    prompt = f"The user asked: {query}\n\n"
-    prompt += "Based on similar questions in your FAQ, here are some relevant answers:\n\n"
-
-    # Add each FAQ question and answer to the prompt
-    for faq in similar_faqs:
-        prompt += f"Q: {faq['question']}\nA: {faq['answer']}\n\n"
+    prelude = (
+        f"The user asked: {query}\n\n"
+        "Based on similar questions in your FAQ, here are some relevant answers:\n\n"
+    )
 
     # Closing note for the LLM to formulate a coherent response
-    prompt += "Using this information, please answer the user's question accurately."
+    closing = "Using this information, please answer the user's question accurately."
+
+    # Add as many FAQ question and answer pairs as fit in the remaining budget, best match first
+    faq_budget = (prompt_builder.token_budget - prompt_builder.response_reserve
+                  - prompt_builder.count_tokens(prelude) - prompt_builder.count_tokens(closing))
+    faq_entries = prompt_builder.select_faqs(similar_faqs, faq_budget)
 
-    return prompt
+    return prelude + "".join(f"{entry}\n\n" for entry in faq_entries) + closing
@@ -1,26 +1,68 @@
 import os
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
-from app.faq_router import router as faq_router
+from starlette.responses import PlainTextResponse
+from app.admission import aggregate_stats, publish_stats_forever, unpublish_stats
+from app.config import Config
+from app.db_interface import DBInterface
+from app.faq_router import router as faq_router, DEFAULT_TENANT_ID
 
 from app.models import ModelSingleton
+from app.snapshots import restore_snapshots, refresh_tenant_indexes_forever, write_snapshots
 
 # Setup logging
 logger = logging.getLogger("uvicorn")
 logger.setLevel(logging.INFO)
 
+def create_database() -> DBInterface:
+    if Config.DB_BACKEND == "sqlite":
+        from app.sqlite_db import SQLiteDB
+        return SQLiteDB()
+    from app.mongodb_db import MongoDB
+    return MongoDB()
+
+
+async def prepare_database(db: DBInterface):
+    # Create indexes, warm caches and tenant indexes from disk, then follow FAQ changes made through other workers
+    try:
+        if asyncio.iscoroutinefunction(db.initialize_db):
+            await db.initialize_db()
+        else:
+            await asyncio.to_thread(db.initialize_db)
+    except Exception as e:
+        logger.error(f"Failed to initialize database: {str(e)}")
+    await restore_snapshots(db, [DEFAULT_TENANT_ID])
+    if Config.LOCAL_INDEX_ENABLED:
+        await refresh_tenant_indexes_forever(db)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialize models asynchronously
     try:
         await ModelSingleton.initialize()
-        yield
     except Exception as e:
         logger.error(f"Failed to initialize models: {str(e)}")
         raise
 
+    # Prepare the database and warm caches in the background so startup is not delayed
+    restore_task = asyncio.create_task(prepare_database(create_database()))
+    # Share this worker's admission counters so /metrics reports the whole machine
+    stats_task = asyncio.create_task(publish_stats_forever())
+    yield
+
+    restore_task.cancel()
+    stats_task.cancel()
+    await asyncio.gather(restore_task, stats_task, return_exceptions=True)
+    await asyncio.to_thread(unpublish_stats)
+    try:
+        await asyncio.to_thread(write_snapshots)
+    except Exception as e:
+        logger.error(f"Failed to write snapshots: {str(e)}")
+
 # Initialize FastAPI app
 app = FastAPI(lifespan=lifespan)
 
@@ -43,7 +85,24 @@ async def root():
 
 @app.get("/chatbot/status")
 async def chatbot_status():
-    return {"status": "Chatbot is running"}
+    return {"status": "Chatbot is running", "admission": aggregate_stats()}
+
+# Prometheus-format metrics summed over all workers, scraped by Fly (see [metrics] in fly.toml) for autoscaling
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    stats = aggregate_stats()
+    lines = [
+        "# TYPE askme_admission_in_flight gauge",
+        f"askme_admission_in_flight {stats['in_flight']}",
+        "# TYPE askme_admission_queue_depth gauge",
+        f"askme_admission_queue_depth {stats['queue_depth']}",
+        "# TYPE askme_admission_admitted_total counter",
+        f"askme_admission_admitted_total {stats['admitted_total']}",
+        "# TYPE askme_admission_rejected_total counter",
+    ]
+    lines += [f'askme_admission_rejected_total{{reason="{reason}"}} {count}'
+              for reason, count in stats["rejected_total"].items()]
+    return "\n".join(lines) + "\n"
 
 
 # Include FAQ Routes
@@ -2,18 +2,26 @@ import asyncio
 
 import spacy
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Literal
 
 from sentence_transformers import SentenceTransformer
 
+from app.prompt_builder import get_prompt_builder
+
 
 class TenantRequest(BaseModel):
     name: str
     config_settings: Optional[Dict[str, str]] = None
 
 
+class ConversationMessage(BaseModel):
+    role: Literal["user", "assistant"]
+    content: str
+
+
 class QueryRequest(BaseModel):
     question: str
+    conversation_history: List[ConversationMessage] = []
 
 
 class ModelSingleton:
@@ -30,6 +38,8 @@ class ModelSingleton:
             cls._sentence_transformer = await asyncio.to_thread(SentenceTransformer, 'all-MiniLM-L6-v2')
         if cls._spacy_nlp is None:
             cls._spacy_nlp = await asyncio.to_thread(spacy.load, 'en_core_web_sm')
+        # Load the prompt tokenizer off the event loop; it may need a download
+        await asyncio.to_thread(get_prompt_builder)
 
     @classmethod
     async def uninitialize(cls):
@@ -0,0 +1,232 @@
+# app/prompt_builder.py
+import logging
+import math
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+
+from app.config import Config
+
+logger = logging.getLogger("uvicorn")
+
+# Kept byte-for-byte identical across requests so the LLM server's prefix cache can reuse it.
+STATIC_PROMPT_PREFIX = (
+    "You are a customer support chatbot, designed to give precise, relevant answers based on the provided FAQ. "
+    "Use the FAQ entries and conversation history below to craft a direct, helpful response to the user's question. "
+    "If the exact answer isn't in the FAQ, infer the best possible answer or advise on next steps.\n\n"
+)
+
+STATIC_PROMPT_SUFFIX = (
+    "Please provide a clear answer based on the information above. "
+    "Use a polite, concise tone and avoid unnecessary elaboration."
+)
+
+# Rough characters-per-token ratio used when no tokenizer is configured.
+CHARS_PER_TOKEN = 4
+
+# Appended to truncated text, and joining the FAQ entries and history lines; all count against the budget.
+ELLIPSIS = "..."
+FAQ_SEPARATOR = "\n\n"
+HISTORY_SEPARATOR = "\n"
+
+
+class PromptBuilder:
+    def __init__(self,
+                 tokenizer: Any = None,
+                 token_budget: int = Config.PROMPT_TOKEN_BUDGET,
+                 response_reserve: int = Config.PROMPT_RESPONSE_RESERVE,
+                 faq_share: float = Config.PROMPT_FAQ_SHARE,
+                 history_summary_tokens: int = Config.PROMPT_HISTORY_SUMMARY_TOKENS):
+        """
+        Initializes the PromptBuilder with a tokenizer and token budget.
+
+        Args:
+            tokenizer: A tokenizer exposing `encode`/`decode` (e.g. a Hugging Face tokenizer) for the target model.
+                If None, token counts are estimated from text length.
+            token_budget: The context window available to the prompt and the response.
+            response_reserve: Tokens kept free for the generated response.
+            faq_share: Fraction of the dynamic budget given to FAQ context before history.
+            history_summary_tokens: Maximum tokens spent summarizing history that falls outside the window.
+        """
+        self.tokenizer = tokenizer
+        self.token_budget = token_budget
+        self.response_reserve = response_reserve
+        self.faq_share = faq_share
+        self.history_summary_tokens = history_summary_tokens
+        # FAQ entries and history messages repeat across requests, so their counts are memoized.
+        self._count_cached = lru_cache(maxsize=4096)(self._count_tokens)
+        self._static_tokens = self.count_tokens(STATIC_PROMPT_PREFIX) + self.count_tokens(STATIC_PROMPT_SUFFIX)
+
+    def _count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Count tokens in the text with the target model's tokenizer.
+
+        Args:
+            text: The text to count.
+
+        Returns:
+            The number of tokens in the text.
+        """
+        if not text:
+            return 0
+        return self._count_cached(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Truncate text so that it fits within max_tokens.
+
+        Args:
+            text: The text to truncate.
+            max_tokens: The maximum number of tokens to keep.
+
+        Returns:
+            The text, cut down to at most max_tokens tokens.
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.count_tokens(text) <= max_tokens:
+            return text
+        keep = max_tokens - self.count_tokens(ELLIPSIS)
+        if keep <= 0:
+            return ""
+        if self.tokenizer is None:
+            return text[:keep * CHARS_PER_TOKEN].rstrip() + ELLIPSIS
+        token_ids = self.tokenizer.encode(text, add_special_tokens=False)[:keep]
+        return self.tokenizer.decode(token_ids).rstrip() + ELLIPSIS
+
+    def select_faqs(self, similar_faqs: List[Dict[str, Any]], max_tokens: int) -> List[str]:
+        """
+        Rerank FAQs by score and keep as many formatted entries as fit within max_tokens.
+
+        Args:
+            similar_faqs: A list of similar FAQs, optionally carrying a similarity "score".
+            max_tokens: The token budget for the FAQ context.
+
+        Returns:
+            A list of formatted "Q: ...\\nA: ..." entries, best match first.
+        """
+        ranked = sorted(similar_faqs, key=lambda faq: faq.get("score", 0.0), reverse=True)
+        separator_tokens = self.count_tokens(FAQ_SEPARATOR)
+        entries = []
+        remaining = max_tokens
+        for faq in ranked:
+            entry = f"Q: {faq['question']}\nA: {faq['answer']}"
+            entry_tokens = self.count_tokens(entry) + separator_tokens
+            if entry_tokens <= remaining:
+                entries.append(entry)
+                remaining -= entry_tokens
+                continue
+            # Keep a truncated answer for the entry that overflows, then stop.
+            header = f"Q: {faq['question']}\nA: "
+            answer_budget = remaining - self.count_tokens(header) - separator_tokens
+            if answer_budget > 0:
+                entries.append(header + self.truncate(faq["answer"], answer_budget))
+            break
+        return entries
+
+    def window_history(self, conversation_history: List[Dict[str, str]], max_tokens: int) -> List[str]:
+        """
+        Keep the most recent messages that fit within max_tokens and summarize the older ones.
+
+        Args:
+            conversation_history: A list of previous conversation messages, oldest first.
+            max_tokens: The token budget for the conversation context.
+
+        Returns:
+            A list of formatted history lines, oldest first.
+        """
+        lines = [f"{message['role'].capitalize()}: {message['content']}" for message in conversation_history]
+        separator_tokens = self.count_tokens(HISTORY_SEPARATOR)
+        if sum(self.count_tokens(line) + separator_tokens for line in lines) <= max_tokens:
+            return lines
+
+        # History overflows: hold back room for a summary of whatever falls outside the window.
+        summary_budget = min(self.history_summary_tokens, max_tokens // 4)
+        window = []
+        remaining = max_tokens - summary_budget
+        for line in reversed(lines):
+            line_tokens = self.count_tokens(line) + separator_tokens
+            if line_tokens > remaining:
+                break
+            window.append(line)
+            remaining -= line_tokens
+        window.reverse()
+
+        older = conversation_history[:len(lines) - len(window)]
+        if older:
+            summary = self.summarize_history(older, summary_budget + remaining - separator_tokens)
+            if summary:
+                window.insert(0, summary)
+        return window
+
+    def summarize_history(self, messages: List[Dict[str, str]], max_tokens: int) -> str:
+        """
+        Summarize older messages as a compact list of the topics the user raised.
+
+        Args:
+            messages: The messages that fell outside the history window.
+            max_tokens: The token budget for the summary.
+
+        Returns:
+            A single summary line, or an empty string if nothing fits.
+        """
+        topics = [" ".join(message["content"].split()[:12]) for message in messages if message["role"] == "user"]
+        if not topics:
+            return ""
+        return self.truncate("Earlier, the user asked about: " + "; ".join(topics), max_tokens)
+
+    def build(self,
+              similar_faqs: List[Dict[str, Any]],
+              user_query: str,
+              conversation_history: Optional[List[Dict[str, str]]] = None) -> str:
+        """
+        Build a prompt that fits the token budget: static prefix, FAQ context, history window, then the question.
+
+        Args:
+            similar_faqs: A list of similar FAQs based on the user's query.
+            user_query: The user's current question.
+            conversation_history: A list of previous conversation messages.
+
+        Returns:
+            A formatted prompt string to send to the LLM.
+        """
+        question = f"User question: {user_query}\n\n"
+        available = (self.token_budget - self.response_reserve - self._static_tokens
+                     - self.count_tokens(question) - self.count_tokens("FAQs:\n\n\nConversation so far:\n\n\n"))
+        if available <= 0:
+            logger.warning("Prompt budget exhausted by the static prompt and question; dropping all context")
+            available = 0
+
+        # FAQ context takes its share first; without history it may use the whole budget.
+        faq_budget = int(available * self.faq_share) if conversation_history else available
+        faq_entries = self.select_faqs(similar_faqs, faq_budget)
+        faq_context = FAQ_SEPARATOR.join(faq_entries)
+        history_budget = available - self.count_tokens(faq_context)
+        conversation_context = HISTORY_SEPARATOR.join(self.window_history(conversation_history or [], history_budget))
+
+        return (
+            f"{STATIC_PROMPT_PREFIX}"
+            f"FAQs:\n{faq_context}\n\n"
+            f"Conversation so far:\n{conversation_context}\n\n"
+            f"{question}"
+            f"{STATIC_PROMPT_SUFFIX}"
+        )
+
+
+@lru_cache(maxsize=1)
+def get_prompt_builder() -> PromptBuilder:
+    """
+    Return the shared PromptBuilder, loading the configured tokenizer once.
+    """
+    tokenizer = None
+    if Config.PROMPT_TOKENIZER:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(Config.PROMPT_TOKENIZER)
+        except Exception as e:
+            logger.error(f"Failed to load prompt tokenizer {Config.PROMPT_TOKENIZER}: {str(e)}")
+    return PromptBuilder(tokenizer=tokenizer)
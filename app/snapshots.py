@@ -0,0 +1,374 @@
+# app/snapshots.py
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Set, Iterator
+
+import numpy as np
+
+from app.answer_cache import answer_cache, AnswerCache
+from app.config import Config
+from app.db_interface import DBInterface
+from app.tenant_index import TenantIndex, TenantIndexBuilder, tenant_indexes
+from app.utils import sanitize_id
+
+logger = logging.getLogger("uvicorn")
+
+# Bump whenever the on-disk layout changes; snapshots of another version are rebuilt.
+SNAPSHOT_FORMAT_VERSION = 1
+
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+MANIFEST_FILE = "manifest.json"
+ANSWER_CACHE_FILE = "answer_cache.json"
+LOCK_FILE = ".lock"
+
+# Tenants whose in-memory index already matches the snapshot on disk
+_persisted: Set[str] = set()
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _tenant_dir(tenant_id: str) -> str:
+    return os.path.join(Config.SNAPSHOT_DIR, "tenants", sanitize_id(str(tenant_id)))
+
+
+@contextmanager
+def snapshot_lock() -> Iterator[None]:
+    """
+    Hold an exclusive lock on SNAPSHOT_DIR, shared by all worker processes on the machine.
+
+    Only take it inside synchronous code (e.g. under `asyncio.to_thread`), never across an await:
+    a cancelled await would leave the lock held by this process.
+    """
+    os.makedirs(Config.SNAPSHOT_DIR, exist_ok=True)
+    with open(os.path.join(Config.SNAPSHOT_DIR, LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_tenant_snapshot(tenant_id: str, index: TenantIndex) -> None:
+    """
+    Write a versioned, checksummed snapshot of a tenant index, replacing any previous one.
+
+    The files are written to a temporary directory first and moved into place under `snapshot_lock`,
+    so readers and other workers never see a partial snapshot.
+
+    Args:
+        tenant_id: The tenant the index belongs to.
+        index: The index to persist.
+    """
+    target = _tenant_dir(tenant_id)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f"{os.path.basename(target)}.tmp-", dir=os.path.dirname(target))
+
+    np.save(os.path.join(staging, EMBEDDINGS_FILE), np.ascontiguousarray(index.embeddings, dtype=np.float32))
+    with open(os.path.join(staging, METADATA_FILE), "w") as f:
+        json.dump(index.metadata, f)
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "tenant_id": tenant_id,
+        "created_at": time.time(),
+        "embedding_dim": int(index.embeddings.shape[1]),
+        "faq_count": len(index),
+        "fingerprint": index.fingerprint,
+        "checksums": {name: _sha256(os.path.join(staging, name)) for name in (EMBEDDINGS_FILE, METADATA_FILE)},
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+
+    with snapshot_lock():
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+    _persisted.add(tenant_id)
+
+
+def read_tenant_snapshot(tenant_id: str, embedding_dim: int, fingerprint: Optional[str] = None) -> Optional[TenantIndex]:
+    """
+    Load a tenant index from its snapshot, memory-mapping the embedding matrix.
+
+    Args:
+        tenant_id: The tenant to load.
+        embedding_dim: The embedding dimension the running models produce.
+        fingerprint: The tenant's current `faqs` fingerprint; a snapshot built from other rows is stale.
+            If None (e.g. the database is unreachable) the snapshot is trusted.
+
+    Returns:
+        The restored TenantIndex, or None if the snapshot is missing, stale or corrupt.
+    """
+    with snapshot_lock():
+        return _read_tenant_snapshot(tenant_id, embedding_dim, fingerprint)
+
+
+def _read_tenant_snapshot(tenant_id: str, embedding_dim: int, fingerprint: Optional[str]) -> Optional[TenantIndex]:
+    directory = _tenant_dir(tenant_id)
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Unreadable snapshot manifest for tenant {tenant_id}: {str(e)}")
+        return None
+
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION or manifest.get("embedding_dim") != embedding_dim:
+        logger.info(f"Snapshot for tenant {tenant_id} has an incompatible format; rebuilding")
+        return None
+    if fingerprint is not None and manifest.get("fingerprint") != fingerprint:
+        logger.info(f"Snapshot for tenant {tenant_id} no longer matches its faqs; rebuilding")
+        return None
+    if time.time() - manifest.get("created_at", 0) > Config.SNAPSHOT_MAX_AGE:
+        logger.info(f"Snapshot for tenant {tenant_id} is older than {Config.SNAPSHOT_MAX_AGE}s; rebuilding")
+        return None
+
+    try:
+        for name, checksum in manifest["checksums"].items():
+            if _sha256(os.path.join(directory, name)) != checksum:
+                logger.warning(f"Checksum mismatch in {name} for tenant {tenant_id}; rebuilding")
+                return None
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, METADATA_FILE)) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Corrupt snapshot for tenant {tenant_id}: {str(e)}")
+        return None
+
+    if embeddings.shape != (manifest["faq_count"], embedding_dim) or len(metadata) != manifest["faq_count"]:
+        logger.warning(f"Snapshot for tenant {tenant_id} does not match its manifest; rebuilding")
+        return None
+
+    _persisted.add(tenant_id)
+    return TenantIndex(embeddings, metadata, manifest.get("fingerprint"))
+
+
+def delete_tenant_snapshot(tenant_id: str) -> None:
+    """
+    Remove a tenant's snapshot so the next startup rebuilds it from the database.
+    """
+    with snapshot_lock():
+        shutil.rmtree(_tenant_dir(tenant_id), ignore_errors=True)
+    _persisted.discard(tenant_id)
+
+
+def has_tenant_snapshot(tenant_id: str) -> bool:
+    """
+    Return True if a snapshot exists for the tenant, whether or not it is still valid.
+    """
+    with snapshot_lock():
+        return os.path.exists(os.path.join(_tenant_dir(tenant_id), MANIFEST_FILE))
+
+
+def snapshot_tenant_ids() -> List[str]:
+    """
+    Return the ids of tenants that have a snapshot on disk.
+    """
+    tenants_dir = os.path.join(Config.SNAPSHOT_DIR, "tenants")
+    if not os.path.isdir(tenants_dir):
+        return []
+    tenant_ids = []
+    for name in os.listdir(tenants_dir):
+        try:
+            with open(os.path.join(tenants_dir, name, MANIFEST_FILE)) as f:
+                tenant_ids.append(json.load(f)["tenant_id"])
+        except (OSError, ValueError, KeyError):
+            continue
+    return tenant_ids
+
+
+def write_answer_cache_snapshot(cache: AnswerCache = answer_cache) -> None:
+    """
+    Merge the live answer cache entries into the snapshot on disk, with a checksum.
+
+    Every worker writes on shutdown, so entries already on disk are kept rather than overwritten;
+    this worker's entries win on conflicts and the longest-lived entries are kept up to the cache size.
+    """
+    with snapshot_lock():
+        merged = {json.dumps(entry["key"]): entry for entry in _read_answer_cache_snapshot()}
+        merged.update((json.dumps(entry["key"]), entry) for entry in cache.dump())
+        kept = sorted(merged.values(), key=lambda entry: entry["ttl"], reverse=True)[:cache.max_entries]
+
+        entries = json.dumps(kept)
+        snapshot = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_at": time.time(),
+            "checksum": hashlib.sha256(entries.encode()).hexdigest(),
+            "entries": entries,
+        }
+        path = os.path.join(Config.SNAPSHOT_DIR, ANSWER_CACHE_FILE)
+        staging = f"{path}.tmp-{os.getpid()}"
+        with open(staging, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(staging, path)
+
+
+def read_answer_cache_snapshot() -> List[Dict[str, object]]:
+    """
+    Read answer cache entries from the snapshot, if present and intact.
+
+    Returns:
+        Entries for `AnswerCache.load` that have not expired while the service was stopped.
+    """
+    with snapshot_lock():
+        return _read_answer_cache_snapshot()
+
+
+def _read_answer_cache_snapshot() -> List[Dict[str, object]]:
+    try:
+        with open(os.path.join(Config.SNAPSHOT_DIR, ANSWER_CACHE_FILE)) as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        logger.warning(f"Unreadable answer cache snapshot: {str(e)}")
+        return []
+
+    if snapshot.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        return []
+    entries = snapshot.get("entries", "")
+    if hashlib.sha256(entries.encode()).hexdigest() != snapshot.get("checksum"):
+        logger.warning("Checksum mismatch in answer cache snapshot; starting cold")
+        return []
+    # Time spent stopped counts against each entry's remaining TTL
+    elapsed = time.time() - snapshot.get("created_at", 0)
+    return [{**entry, "ttl": entry["ttl"] - elapsed} for entry in json.loads(entries) if entry["ttl"] > elapsed]
+
+
+async def _call(method, *args):
+    # SQLiteDB implements the interface synchronously
+    if asyncio.iscoroutinefunction(method):
+        return await method(*args)
+    return await asyncio.to_thread(method, *args)
+
+
+async def rebuild_tenant_index(db: DBInterface, tenant_id: str, embedding_dim: int) -> TenantIndex:
+    """
+    Rebuild a tenant index from its rows in `faqs` and snapshot it.
+
+    Backends that stream rows (`iter_faqs`) are decoded batch by batch, so the raw documents
+    with their embedding bytes are never all held in memory at once.
+    """
+    builder = TenantIndexBuilder(embedding_dim)
+    iter_faqs = getattr(db, "iter_faqs", None)
+    if iter_faqs is not None:
+        batch = []
+        async for faq in iter_faqs(tenant_id):
+            batch.append(faq)
+            if len(batch) >= Config.MONGODB_BATCH_SIZE:
+                await asyncio.to_thread(builder.add_many, batch)
+                batch = []
+        await asyncio.to_thread(builder.add_many, batch)
+    else:
+        faqs = await _call(db.get_faqs, tenant_id)
+        await asyncio.to_thread(builder.add_many, faqs)
+    index = await asyncio.to_thread(builder.build)
+    await asyncio.to_thread(write_tenant_snapshot, tenant_id, index)
+    return index
+
+
+async def restore_snapshots(db: DBInterface, tenant_ids: List[str], embedding_dim: int = 384) -> None:
+    """
+    Warm the answer cache and tenant indexes from disk, rebuilding tenant snapshots that are stale against `faqs`.
+
+    Args:
+        db: The database to check snapshots against and rebuild stale tenant indexes from.
+        tenant_ids: Tenants to warm in addition to those with a snapshot on disk.
+        embedding_dim: The embedding dimension the running models produce.
+    """
+    # Only the file read runs off the event loop; the cache itself is not thread-safe
+    entries = await asyncio.to_thread(read_answer_cache_snapshot)
+    answer_cache.load(entries)
+    logger.info(f"Restored {len(entries)} cached answers from snapshot")
+
+    if not Config.LOCAL_INDEX_ENABLED:
+        return
+
+    on_disk = await asyncio.to_thread(snapshot_tenant_ids)
+    for tenant_id in dict.fromkeys(tenant_ids + on_disk):
+        try:
+            fingerprint = await _call(db.get_faq_fingerprint, tenant_id)
+        except Exception as e:
+            logger.warning(f"Could not fingerprint faqs for tenant {tenant_id}, trusting snapshot: {str(e)}")
+            fingerprint = None
+        await _load_tenant_index(db, tenant_id, embedding_dim, fingerprint)
+
+
+async def _load_tenant_index(db: DBInterface, tenant_id: str, embedding_dim: int, fingerprint: Optional[str]) -> None:
+    # Prefer a snapshot matching the fingerprint, which another worker may already have written
+    index = await asyncio.to_thread(read_tenant_snapshot, tenant_id, embedding_dim, fingerprint)
+    if index is None:
+        try:
+            index = await rebuild_tenant_index(db, tenant_id, embedding_dim)
+        except Exception as e:
+            logger.error(f"Failed to rebuild index for tenant {tenant_id}: {str(e)}")
+            return
+    if not len(index):
+        # Nothing to serve locally; leave the tenant on Pinecone
+        tenant_indexes.pop(tenant_id, None)
+        return
+    tenant_indexes[tenant_id] = index
+    logger.info(f"Loaded index for tenant {tenant_id} with {len(index)} FAQs")
+
+
+async def refresh_tenant_indexes(db: DBInterface, embedding_dim: int = 384) -> None:
+    """
+    Bring this worker's tenant indexes in line with changes made by other workers.
+
+    A tenant whose snapshot was deleted (new embeddings were stored through another worker) goes back to Pinecone,
+    and a tenant whose `faqs` fingerprint changed is reloaded from a matching snapshot or rebuilt.
+
+    Args:
+        db: The database to fingerprint and rebuild from.
+        embedding_dim: The embedding dimension the running models produce.
+    """
+    for tenant_id, index in list(tenant_indexes.items()):
+        if not await asyncio.to_thread(has_tenant_snapshot, tenant_id):
+            tenant_indexes.pop(tenant_id, None)
+            _persisted.discard(tenant_id)
+            logger.info(f"Snapshot for tenant {tenant_id} was invalidated; serving it from Pinecone")
+            continue
+        try:
+            fingerprint = await _call(db.get_faq_fingerprint, tenant_id)
+        except Exception as e:
+            logger.warning(f"Could not fingerprint faqs for tenant {tenant_id}: {str(e)}")
+            continue
+        if fingerprint != index.fingerprint:
+            await _load_tenant_index(db, tenant_id, embedding_dim, fingerprint)
+
+
+async def refresh_tenant_indexes_forever(db: DBInterface, interval: float = Config.LOCAL_INDEX_REFRESH_INTERVAL) -> None:
+    """
+    Refresh tenant indexes periodically until cancelled.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_tenant_indexes(db)
+        except Exception as e:
+            logger.error(f"Failed to refresh tenant indexes: {str(e)}")
+
+
+def write_snapshots() -> None:
+    """
+    Persist tenant indexes that changed since they were loaded, and the answer cache.
+    """
+    for tenant_id, index in list(tenant_indexes.items()):
+        if tenant_id not in _persisted:
+            write_tenant_snapshot(tenant_id, index)
+    write_answer_cache_snapshot()
@@ -1,6 +1,6 @@
 import sqlite3
 from app.db_interface import DBInterface
-from app.utils import generate_api_key  # Import the generate_api_key function
+from app.utils import generate_api_key, FaqFingerprint  # Import the generate_api_key function
 from typing import List, Dict, Optional
 
 
@@ -36,11 +36,18 @@ class SQLiteDB(DBInterface):
                            (tenant_id, question, answer, embedding))
             conn.commit()
 
-    def get_faqs(self, tenant_id: int) -> List[Dict[str, str]]:
+    def get_faqs(self, tenant_id: int, include_embeddings: bool = True) -> List[Dict[str, str]]:
+        columns = "question, answer, embedding" if include_embeddings else "question, answer"
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT question, answer, embedding FROM faqs WHERE tenant_id=?", (tenant_id,))
-            return [{"question": row["question"], "answer": row["answer"], "embedding": row["embedding"]} for row in cursor.fetchall()]
+            cursor.execute(f"SELECT {columns} FROM faqs WHERE tenant_id=?", (tenant_id,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_faq_fingerprint(self, tenant_id: int) -> str:
+        fingerprint = FaqFingerprint()
+        for faq in self.get_faqs(tenant_id, include_embeddings=False):
+            fingerprint.update(faq["question"], faq["answer"])
+        return fingerprint.hexdigest()
 
     def get_tenant_by_api_key(self, api_key: str) -> Optional[int]:
         with self._get_connection() as conn:
@@ -0,0 +1,156 @@
+# app/tenant_index.py
+import io
+import logging
+import pickle
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
+
+from app.utils import sanitize_id, FaqFingerprint
+
+logger = logging.getLogger("uvicorn")
+
+
+class _EmbeddingUnpickler(pickle.Unpickler):
+    # Only what a pickled ndarray needs; anything else in a row is refused rather than executed
+    ALLOWED = {
+        ("numpy", "ndarray"),
+        ("numpy", "dtype"),
+        ("numpy.core.multiarray", "_reconstruct"),
+        ("numpy._core.multiarray", "_reconstruct"),
+    }
+
+    def find_class(self, module, name):
+        if (module, name) not in self.ALLOWED:
+            raise pickle.UnpicklingError(f"Refusing to unpickle {module}.{name}")
+        return super().find_class(module, name)
+
+
+def decode_embedding(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    """
+    Decode an FAQ embedding as stored in `faqs`.
+
+    Rows hold a pickled float32 ndarray (the format of the existing data); raw float32 bytes are accepted too.
+
+    Args:
+        blob: The stored embedding bytes.
+
+    Returns:
+        A flat float32 vector, or None if the blob is empty or cannot be decoded.
+    """
+    if not blob:
+        return None
+    if blob[:1] == b"\x80":  # pickle protocol 2+ header
+        try:
+            return np.asarray(_EmbeddingUnpickler(io.BytesIO(blob)).load(), dtype=np.float32).ravel()
+        except (pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError):
+            pass
+    if len(blob) % 4:
+        return None
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+class TenantIndex:
+    def __init__(self, embeddings: np.ndarray, metadata: List[Dict[str, str]], fingerprint: Optional[str] = None):
+        """
+        Initializes an in-memory FAQ index for a single tenant.
+
+        Args:
+            embeddings: A (num_faqs, embedding_dim) float32 matrix of L2-normalized FAQ embeddings.
+                May be a read-only memory map restored from a snapshot.
+            metadata: One dictionary per row with the FAQ "id", "question" and "answer".
+            fingerprint: The `FaqFingerprint` of the rows the index was built from, if known.
+        """
+        self.embeddings = embeddings
+        self.metadata = metadata
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_faqs(cls, faqs: Iterable[Dict[str, Any]], embedding_dim: int) -> "TenantIndex":
+        """
+        Build an index from FAQ rows as returned by `DBInterface.get_faqs`.
+
+        Args:
+            faqs: FAQ dictionaries with "question", "answer" and an "embedding" as decoded by `decode_embedding`.
+            embedding_dim: The expected embedding dimension; rows with a different size are skipped.
+
+        Returns:
+            A TenantIndex over the decodable FAQs.
+        """
+        builder = TenantIndexBuilder(embedding_dim)
+        builder.add_many(faqs)
+        return builder.build()
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Find the FAQs most similar to the query embedding by cosine similarity.
+
+        Args:
+            query_embedding: The embedding of the preprocessed user query.
+            top_k: The number of top similar FAQs to retrieve.
+
+        Returns:
+            A list of dictionaries containing the most similar FAQs, their ids and scores.
+        """
+        if not self.metadata:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        scores = self.embeddings @ query
+        top = np.argsort(-scores)[:top_k]
+        return [{**self.metadata[i], "score": float(scores[i])} for i in top]
+
+    def __len__(self) -> int:
+        return len(self.metadata)
+
+
+class TenantIndexBuilder:
+    def __init__(self, embedding_dim: int):
+        """
+        Accumulates FAQ rows into a TenantIndex, so they can be fed batch by batch as they are read.
+
+        Only the decoded vectors and text are kept; each batch of raw rows can be dropped once added.
+
+        Args:
+            embedding_dim: The expected embedding dimension; rows with a different size are skipped.
+        """
+        self.embedding_dim = embedding_dim
+        self._vectors: List[np.ndarray] = []
+        self._metadata: List[Dict[str, str]] = []
+        self._fingerprint = FaqFingerprint()
+        self._skipped = 0
+
+    def add_many(self, faqs: Iterable[Dict[str, Any]]) -> None:
+        """
+        Decode and add FAQ rows with "question", "answer" and "embedding".
+        """
+        for faq in faqs:
+            self._fingerprint.update(faq["question"], faq["answer"])
+            embedding = decode_embedding(faq.get("embedding"))
+            if embedding is None or embedding.shape[0] != self.embedding_dim:
+                self._skipped += 1
+                continue
+            self._vectors.append(embedding)
+            self._metadata.append({"id": sanitize_id(faq["question"]), "question": faq["question"], "answer": faq["answer"]})
+
+    def build(self) -> TenantIndex:
+        """
+        Return a TenantIndex over the FAQs added so far, with L2-normalized embeddings.
+        """
+        if self._skipped:
+            logger.warning(f"Skipped {self._skipped} FAQs without a decodable {self.embedding_dim}-dimensional embedding")
+        if self._vectors:
+            embeddings = np.vstack(self._vectors)
+        else:
+            embeddings = np.empty((0, self.embedding_dim), dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+        return TenantIndex(embeddings.astype(np.float32), self._metadata, self._fingerprint.hexdigest())
+
+
+# Loaded tenant indexes for the process, keyed by tenant id
+tenant_indexes: Dict[str, TenantIndex] = {}
+
+
+def get_tenant_index(tenant_id: str) -> Optional[TenantIndex]:
+    return tenant_indexes.get(tenant_id)
@@ -1,4 +1,5 @@
 import asyncio
+import hashlib
 import json
 import secrets
 
@@ -40,3 +41,22 @@ def sanitize_id(text: str) -> str:
     # Replace spaces and other invalid characters with an underscore or hyphen
     sanitized = re.sub(r'\W+', '_', sanitized)
     return sanitized
+
+
+class FaqFingerprint:
+    """
+    Order-independent digest of a tenant's FAQ questions and answers, built one row at a time.
+    Used to tell whether a snapshot still matches the `faqs` rows it was built from.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+
+    def update(self, question: str, answer: str) -> None:
+        digest = hashlib.sha256(f"{question}\0{answer}".encode()).digest()
+        self.count += 1
+        self.total = (self.total + int.from_bytes(digest, "big")) % (1 << 256)
+
+    def hexdigest(self) -> str:
+        return f"{self.count}-{self.total:064x}"
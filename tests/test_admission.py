@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app.admission import (AdmissionController, PRIORITY_CACHE_HIT, PRIORITY_COLD,
+                           aggregate_stats, publish_stats)
+from app.config import Config
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    # Let woken waiters run
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_admits_immediately_under_limit():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=2, max_in_flight_per_tenant=2, max_queue=4, max_wait=1)
+        first = await controller.acquire("a")
+        second = await controller.acquire("b")
+        assert controller.stats()["in_flight"] == 2
+        first.release()
+        second.release()
+        assert controller.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_dispatches_by_priority_then_arrival():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_in_flight_per_tenant=1, max_queue=4, max_wait=1)
+        holder = await controller.acquire("a")
+        order = []
+
+        async def wait(name, priority):
+            ticket = await controller.acquire(name, priority)
+            order.append(name)
+            ticket.release()
+
+        tasks = [asyncio.create_task(wait("cold-1", PRIORITY_COLD)),
+                 asyncio.create_task(wait("cold-2", PRIORITY_COLD)),
+                 asyncio.create_task(wait("hit", PRIORITY_CACHE_HIT))]
+        await settle()
+        assert controller.stats()["queue_depth"] == 3
+
+        holder.release()
+        await asyncio.gather(*tasks)
+        assert order == ["hit", "cold-1", "cold-2"]
+
+    run(scenario())
+
+
+def test_tenant_limit_does_not_block_other_tenants():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=3, max_in_flight_per_tenant=1, max_queue=4, max_wait=1)
+        await controller.acquire("a")
+        blocked = asyncio.create_task(controller.acquire("a"))
+        await settle()
+        other = await controller.acquire("b")
+        assert not blocked.done()
+        assert other.tenant_id == "b"
+        blocked.cancel()
+
+    run(scenario())
+
+
+def test_rejects_when_queue_full():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_in_flight_per_tenant=1, max_queue=1, max_wait=1)
+        await controller.acquire("a")
+        queued = asyncio.create_task(controller.acquire("b"))
+        await settle()
+        with pytest.raises(HTTPException) as exc_info:
+            await controller.acquire("c")
+        queued.cancel()
+        return exc_info.value, controller.stats()
+
+    error, stats = run(scenario())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+    assert stats["rejected_total"]["queue_full"] == 1
+
+
+def test_rejects_when_estimated_wait_exceeds_deadline():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_in_flight_per_tenant=1, max_queue=4, max_wait=0.5)
+        controller._avg_service_time = 3.0
+        await controller.acquire("a")
+        with pytest.raises(HTTPException) as exc_info:
+            await controller.acquire("b")
+        return exc_info.value, controller.stats()
+
+    error, stats = run(scenario())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "3"
+    assert stats["rejected_total"]["deadline"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_no_deadline_rejection_before_service_time_is_known():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_in_flight_per_tenant=1, max_queue=4, max_wait=0.5)
+        holder = await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await settle()
+        holder.release()
+        ticket = await waiter
+        return ticket, controller.stats()
+
+    ticket, stats = run(scenario())
+    assert ticket.tenant_id == "b"
+    assert stats["rejected_total"]["deadline"] == 0
+
+
+def test_rejects_after_waiting_past_deadline():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_in_flight_per_tenant=1, max_queue=4, max_wait=0.05)
+        await controller.acquire("a")
+        with pytest.raises(HTTPException) as exc_info:
+            await controller.acquire("b")
+        return exc_info.value, controller.stats()
+
+    error, stats = run(scenario())
+    assert error.status_code == 429
+    assert "Retry-After" in error.headers
+    assert stats["rejected_total"]["timeout"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_in_flight_per_tenant=1, max_queue=4, max_wait=1)
+        holder = await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await settle()
+        waiter.cancel()
+        await settle()
+        assert controller.stats()["queue_depth"] == 0
+        holder.release()
+        assert controller.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_waiter_cancelled_after_admission_releases_slot():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_in_flight_per_tenant=1, max_queue=4, max_wait=1)
+        holder = await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await settle()
+        # Admit the waiter, then cancel it before it resumes
+        holder.release()
+        waiter.cancel()
+        await settle()
+        assert waiter.cancelled()
+        assert controller.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_guard_releases_when_stream_closes_early():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_in_flight_per_tenant=1, max_queue=4, max_wait=1)
+        ticket = await controller.acquire("a")
+
+        async def body():
+            for chunk in ("a", "b", "c"):
+                yield chunk
+
+        stream = ticket.guard(body())
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+        assert controller.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_aggregate_stats_sums_live_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "METRICS_DIR", str(tmp_path))
+    (tmp_path / "99999.json").write_text(json.dumps(
+        {"in_flight": 2, "queue_depth": 3, "admitted_total": 10, "rejected_total": {"timeout": 1}}))
+    stale = tmp_path / "99998.json"
+    stale.write_text(json.dumps({"in_flight": 7, "queue_depth": 7, "admitted_total": 7, "rejected_total": {}}))
+    os.utime(stale, (0, 0))
+
+    controller = AdmissionController(max_in_flight=1, max_in_flight_per_tenant=1, max_queue=4, max_wait=1)
+    run(controller.acquire("a"))
+    publish_stats(controller)
+    stats = aggregate_stats(controller)
+
+    assert stats["in_flight"] == 3
+    assert stats["queue_depth"] == 3
+    assert stats["admitted_total"] == 11
+    assert stats["rejected_total"]["timeout"] == 1
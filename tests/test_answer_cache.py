@@ -0,0 +1,126 @@
+import types
+
+import pytest
+
+from app.answer_cache import AnswerCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("app.answer_cache.time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def faq(faq_id, answer="An answer."):
+    return {"id": faq_id, "question": f"{faq_id}?", "answer": answer}
+
+
+def key(cache, query, faqs, tenant_id="t1"):
+    return cache.make_key(tenant_id, "m", query, faqs)
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = AnswerCache(ttl=10)
+    stroke = key(cache, "what is stroke", [faq("stroke")])
+    cache.put(stroke, ["data: one\n\n"])
+
+    clock.now += 9
+    assert cache.get(stroke) == ["data: one\n\n"]
+    clock.now += 2
+    assert cache.get(stroke) is None
+    assert len(cache) == 0
+    assert cache._by_query == {} and cache._by_faq == {}
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = AnswerCache(max_entries=2)
+    first, second, third = (key(cache, query, [faq(query)]) for query in ("first", "second", "third"))
+    cache.put(first, ["1"])
+    cache.put(second, ["2"])
+    cache.get(first)
+    cache.put(third, ["3"])
+
+    assert cache.get(second) is None
+    assert cache.get(first) == ["1"]
+    assert cache.get(third) == ["3"]
+    assert ("t1", "second") not in cache._by_faq
+
+
+def test_query_normalization_shares_entries(clock):
+    cache = AnswerCache()
+    cache.put(key(cache, "What is stroke?", [faq("stroke")]), ["1"])
+
+    assert cache.get(key(cache, "  what IS   stroke ", [faq("stroke")])) == ["1"]
+
+
+def test_key_changes_when_faq_content_changes(clock):
+    cache = AnswerCache()
+    cache.put(key(cache, "what is stroke", [faq("stroke", "Old answer.")]), ["1"])
+
+    assert cache.get(key(cache, "what is stroke", [faq("stroke", "New answer.")])) is None
+
+
+def test_invalidate_faqs_drops_dependent_answers(clock):
+    cache = AnswerCache()
+    both = key(cache, "stroke or fever", [faq("stroke"), faq("fever")])
+    fever = key(cache, "what is fever", [faq("fever")])
+    cache.put(both, ["1"])
+    cache.put(fever, ["2"])
+
+    cache.invalidate_faqs("t1", ["stroke"])
+
+    assert cache.get(both) is None
+    assert cache.get(fever) == ["2"]
+    # The reverse indexes no longer point at the dropped answer
+    assert cache._by_faq == {("t1", "fever"): {fever}}
+    assert ("t1", "m", "stroke or fever") not in cache._by_query
+
+
+def test_invalidate_tenant_keeps_other_tenants(clock):
+    cache = AnswerCache()
+    mine = key(cache, "what is stroke", [faq("stroke")], tenant_id="t1")
+    theirs = key(cache, "what is stroke", [faq("stroke")], tenant_id="t2")
+    cache.put(mine, ["1"])
+    cache.put(theirs, ["2"])
+
+    cache.invalidate_tenant("t1")
+
+    assert cache.get(mine) is None
+    assert cache.get(theirs) == ["2"]
+    assert not cache.has_query("t1", "m", "what is stroke")
+
+
+def test_has_query_ignores_retrieved_faqs_and_expired_entries(clock):
+    cache = AnswerCache(ttl=10)
+    cache.put(key(cache, "what is stroke", [faq("stroke")]), ["1"])
+
+    assert cache.has_query("t1", "m", "What is stroke?")
+    assert not cache.has_query("t1", "m", "what is fever")
+    assert not cache.has_query("t1", "other-model", "what is stroke")
+
+    clock.now += 11
+    assert not cache.has_query("t1", "m", "what is stroke")
+    assert len(cache) == 0
+
+
+def test_dump_and_load_keep_remaining_ttl(clock):
+    cache = AnswerCache(ttl=10)
+    stroke = key(cache, "what is stroke", [faq("stroke")])
+    cache.put(stroke, ["1"])
+    clock.now += 4
+
+    restored = AnswerCache(ttl=10)
+    restored.load(cache.dump())
+    clock.now += 5
+    assert restored.get(stroke) == ["1"]
+    clock.now += 2
+    assert restored.get(stroke) is None
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import pickle
+import uuid
+
+import numpy as np
+import pymongo
+import pymongo.errors
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from app import snapshots
+from app.config import Config
+from app.mongodb_db import MongoDB
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def db():
+    # Runs against an in-memory stand-in, or a real mongod when MONGODB_TEST_URI is set
+    test_uri = os.getenv("MONGODB_TEST_URI")
+    if not test_uri:
+        yield MongoDB(client=AsyncMongoMockClient())
+        return
+    db_name = f"askme_test_{uuid.uuid4().hex}"
+    yield MongoDB(test_uri, db_name)
+    pymongo.MongoClient(test_uri).drop_database(db_name)
+
+
+def test_initialize_db_creates_indexes(db):
+    async def scenario():
+        await db.initialize_db()
+        return (await db.db["tenants"].index_information(), await db.db["faqs"].index_information())
+
+    tenant_indexes, faq_indexes = run(scenario())
+    assert any(index["key"] == [("api_key", 1)] and index.get("unique") for index in tenant_indexes.values())
+    assert any(index["key"] == [("tenant_id", 1)] for index in faq_indexes.values())
+
+
+def test_api_key_index_is_unique(db):
+    async def scenario():
+        await db.initialize_db()
+        await db.db["tenants"].insert_one({"name": "a", "api_key": "key"})
+        await db.db["tenants"].insert_one({"name": "b", "api_key": "key"})
+
+    with pytest.raises(pymongo.errors.DuplicateKeyError):
+        run(scenario())
+
+
+def test_get_faqs_projects_fields(db):
+    async def scenario():
+        await db.add_faq("t1", "What is stroke?", "A loss of blood flow.", b"\x00\x01")
+        await db.add_faq("t2", "Other tenant?", "Not returned.", b"\x02")
+        return await db.get_faqs("t1"), await db.get_faqs("t1", include_embeddings=False)
+
+    with_embeddings, without_embeddings = run(scenario())
+    assert with_embeddings == [{"question": "What is stroke?", "answer": "A loss of blood flow.", "embedding": b"\x00\x01"}]
+    assert without_embeddings == [{"question": "What is stroke?", "answer": "A loss of blood flow."}]
+
+
+def test_get_tenant_by_api_key(db):
+    async def scenario():
+        await db.initialize_db()
+        tenant = await db.create_tenant("clinic", {"language": "en"})
+        return (tenant, await db.get_tenant_by_api_key(tenant["api_key"]),
+                await db.get_tenant_by_api_key("missing"), await db.db["settings"].count_documents({}))
+
+    tenant, found, missing, settings_count = run(scenario())
+    assert found == tenant["tenant_id"]
+    assert missing is None
+    assert settings_count == 1
+
+
+def test_faq_fingerprint_tracks_faq_changes(db):
+    async def scenario():
+        await db.add_faq("t1", "What is stroke?", "A loss of blood flow.", b"\x00")
+        before = await db.get_faq_fingerprint("t1")
+        await db.db["faqs"].update_one({"tenant_id": "t1"}, {"$set": {"answer": "Updated."}})
+        return before, await db.get_faq_fingerprint("t1")
+
+    before, after = run(scenario())
+    assert before != after
+    assert before.startswith("1-")
+
+
+def test_rebuild_tenant_index_streams_faqs_in_batches(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "MONGODB_BATCH_SIZE", 2)
+
+    async def no_get_faqs(*args, **kwargs):
+        raise AssertionError("the rebuild must not materialize every FAQ")
+
+    monkeypatch.setattr(db, "get_faqs", no_get_faqs)
+
+    async def scenario():
+        for i in range(5):
+            vector = np.eye(4, dtype=np.float32)[i % 4]
+            await db.add_faq("t1", f"Question {i}?", f"Answer {i}.", pickle.dumps(vector))
+        return await snapshots.rebuild_tenant_index(db, "t1", 4), await db.get_faq_fingerprint("t1")
+
+    index, fingerprint = run(scenario())
+    assert len(index) == 5
+    assert index.fingerprint == fingerprint
+    assert snapshots.read_tenant_snapshot("t1", 4, fingerprint) is not None
@@ -0,0 +1,103 @@
+import importlib
+import sys
+import types
+
+import pytest
+
+from app.prompt_builder import PromptBuilder
+
+
+def make_faq(question, answer, score):
+    return {"id": question, "question": question, "answer": answer, "score": score}
+
+
+def make_history(turns):
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"Question number {turn} about clinic opening hours and parking"})
+        history.append({"role": "assistant", "content": f"Answer number {turn}: " + "details " * 20})
+    return history
+
+
+@pytest.fixture
+def builder():
+    # No tokenizer: counts are estimated from text length
+    return PromptBuilder(tokenizer=None, token_budget=400, response_reserve=100,
+                         faq_share=0.6, history_summary_tokens=40)
+
+
+def test_prompt_stays_within_budget(builder):
+    faqs = [make_faq(f"Question {i}?", "An answer. " * 40, 1 - i / 10) for i in range(5)]
+    prompt = builder.build(faqs, "When are you open?", make_history(10))
+
+    assert builder.count_tokens(prompt) <= builder.token_budget - builder.response_reserve
+
+
+def test_faqs_are_ordered_by_score(builder):
+    faqs = [make_faq("Low?", "low", 0.2), make_faq("High?", "high", 0.9), make_faq("Mid?", "mid", 0.5)]
+    prompt = builder.build(faqs, "Which?")
+
+    assert prompt.index("Q: High?") < prompt.index("Q: Mid?") < prompt.index("Q: Low?")
+
+
+def test_select_faqs_truncates_the_overflowing_entry(builder):
+    faqs = [make_faq("First?", "a" * 40, 0.9), make_faq("Second?", "b" * 400, 0.8), make_faq("Third?", "c", 0.7)]
+    entries = builder.select_faqs(faqs, 40)
+
+    assert len(entries) == 2
+    assert entries[0] == "Q: First?\nA: " + "a" * 40
+    assert entries[1].startswith("Q: Second?\nA: b") and entries[1].endswith("...")
+    assert sum(builder.count_tokens(entry) for entry in entries) <= 40
+
+
+def test_window_history_keeps_newest_messages_and_summarizes_older(builder):
+    history = make_history(6)
+    lines = builder.window_history(history, 120)
+
+    assert lines[0].startswith("Earlier, the user asked about: Question number 0")
+    assert lines[-1] == f"Assistant: {history[-1]['content']}"
+    assert lines[-2] == f"User: {history[-2]['content']}"
+    assert sum(builder.count_tokens(line) for line in lines) <= 120
+
+
+def test_window_history_returns_everything_when_it_fits(builder):
+    history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+
+    assert builder.window_history(history, 100) == ["User: Hi", "Assistant: Hello"]
+
+
+def test_context_is_dropped_when_budget_is_exhausted(caplog):
+    builder = PromptBuilder(tokenizer=None, token_budget=50, response_reserve=40)
+    prompt = builder.build([make_faq("Question?", "Answer.", 1.0)], "When are you open?", make_history(2))
+
+    assert "Q: Question?" not in prompt
+    assert "Question number 0" not in prompt
+    assert "User question: When are you open?" in prompt
+    assert "Prompt budget exhausted" in caplog.text
+
+
+class WordTokenizer:
+    # Stands in for the GPT-2 tokenizer: one token per whitespace-separated word
+    model_max_length = 600
+
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+    def decode(self, token_ids):
+        return " ".join(token_ids)
+
+
+def test_gpt2_prompt_stays_within_budget(monkeypatch):
+    generator = types.SimpleNamespace(tokenizer=WordTokenizer())
+    monkeypatch.setitem(sys.modules, "transformers", types.SimpleNamespace(pipeline=lambda *args, **kwargs: generator))
+    monkeypatch.delitem(sys.modules, "app.llm_integration", raising=False)
+    llm_integration = importlib.import_module("app.llm_integration")
+    monkeypatch.delitem(sys.modules, "app.llm_integration")
+
+    builder = llm_integration.prompt_builder
+    faqs = [make_faq(f"Question {i}?", "word " * 100, i / 10) for i in range(5)]
+    prompt = llm_integration.construct_prompt(faqs, "When are you open?")
+
+    assert builder.count_tokens(prompt) <= builder.token_budget - builder.response_reserve
+    assert prompt.index("Q: Question 4?") < prompt.index("Q: Question 3?")
+    assert "Q: Question 0?" not in prompt
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from app import snapshots
+from app.answer_cache import AnswerCache, answer_cache
+from app.config import Config
+from app.sqlite_db import SQLiteDB
+from app.tenant_index import TenantIndex, decode_embedding, tenant_indexes
+
+EMBEDDING_DIM = 4
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(Config, "LOCAL_INDEX_ENABLED", True)
+    tenant_indexes.clear()
+    answer_cache.clear()
+    snapshots._persisted.clear()
+
+    database = SQLiteDB(str(tmp_path / "faqs.db"))
+    database.initialize_db()
+    add_faq(database, "What is stroke?", "A loss of blood flow to the brain.", [1, 0, 0, 0])
+    add_faq(database, "What is a fever?", "A raised body temperature.", [0, 1, 0, 0])
+    yield database
+    tenant_indexes.clear()
+    answer_cache.clear()
+
+
+def add_faq(database, question, answer, vector):
+    # Stored the way the existing rows are: a pickled float32 ndarray
+    database.add_faq(1, question, answer, pickle.dumps(np.array(vector, dtype=np.float32)))
+
+
+def restore(database):
+    asyncio.run(snapshots.restore_snapshots(database, [1], EMBEDDING_DIM))
+
+
+def test_restore_builds_snapshot_then_reuses_it(db):
+    restore(db)
+    assert len(tenant_indexes[1]) == 2
+    assert snapshots.snapshot_tenant_ids() == [1]
+
+    tenant_indexes.clear()
+    restored = snapshots.read_tenant_snapshot(1, EMBEDDING_DIM, db.get_faq_fingerprint(1))
+    assert restored is not None
+    assert isinstance(restored.embeddings, np.memmap)
+    assert restored.search(np.array([1, 0, 0, 0]), top_k=1)[0]["question"] == "What is stroke?"
+
+
+def test_snapshot_is_stale_when_faqs_change(db):
+    restore(db)
+    add_faq(db, "What is a cold?", "A viral infection.", [0, 0, 1, 0])
+
+    assert snapshots.read_tenant_snapshot(1, EMBEDDING_DIM, db.get_faq_fingerprint(1)) is None
+
+    tenant_indexes.clear()
+    restore(db)
+    assert len(tenant_indexes[1]) == 3
+
+
+def test_concurrent_snapshot_writes_do_not_fail(db):
+    index = asyncio.run(snapshots.rebuild_tenant_index(db, 1, EMBEDDING_DIM))
+    errors = []
+
+    def write():
+        try:
+            for _ in range(10):
+                snapshots.write_tenant_snapshot(1, index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert snapshots.read_tenant_snapshot(1, EMBEDDING_DIM, index.fingerprint) is not None
+
+
+def test_answer_cache_snapshots_from_workers_are_merged(db):
+    faqs = [{"id": "What_is_stroke_", "question": "What is stroke?", "answer": "A loss of blood flow."}]
+    first_worker, second_worker = AnswerCache(), AnswerCache()
+    first_worker.put(first_worker.make_key("1", "m", "what is stroke", faqs), ["data: one\n\n"])
+    second_worker.put(second_worker.make_key("1", "m", "define stroke", faqs), ["data: two\n\n"])
+
+    snapshots.write_answer_cache_snapshot(first_worker)
+    snapshots.write_answer_cache_snapshot(second_worker)
+    # A worker stopped before its restore finished must not wipe the snapshot
+    snapshots.write_answer_cache_snapshot(AnswerCache())
+
+    restored = AnswerCache()
+    restored.load(snapshots.read_answer_cache_snapshot())
+    assert len(restored) == 2
+    assert restored.get(restored.make_key("1", "m", "What is stroke?", faqs)) == ["data: one\n\n"]
+
+
+def test_decode_embedding_formats():
+    vector = np.array([1, 2, 3, 4], dtype=np.float32)
+
+    assert np.array_equal(decode_embedding(pickle.dumps(vector)), vector)
+    assert np.array_equal(decode_embedding(vector.tobytes()), vector)
+    assert decode_embedding(pickle.dumps(os.getcwd)) is None
+    assert decode_embedding(b"") is None
+
+
+def test_rows_without_usable_embeddings_are_skipped_with_a_warning(caplog):
+    faqs = [
+        {"question": "Kept?", "answer": "Yes.", "embedding": pickle.dumps(np.ones(EMBEDDING_DIM, dtype=np.float32))},
+        {"question": "Wrong size?", "answer": "No.", "embedding": pickle.dumps(np.ones(3, dtype=np.float32))},
+        {"question": "Missing?", "answer": "No.", "embedding": None},
+    ]
+    with caplog.at_level(logging.WARNING, logger="uvicorn"):
+        index = TenantIndex.from_faqs(faqs, EMBEDDING_DIM)
+
+    assert [faq["question"] for faq in index.metadata] == ["Kept?"]
+    assert "Skipped 2 FAQs" in caplog.text
+
+
+def test_refresh_drops_index_invalidated_by_another_worker(db):
+    restore(db)
+    snapshots.delete_tenant_snapshot(1)
+
+    asyncio.run(snapshots.refresh_tenant_indexes(db, EMBEDDING_DIM))
+    assert 1 not in tenant_indexes
+
+
+def test_refresh_reloads_index_when_faqs_change(db):
+    restore(db)
+    add_faq(db, "What is a cold?", "A viral infection.", [0, 0, 1, 0])
+
+    asyncio.run(snapshots.refresh_tenant_indexes(db, EMBEDDING_DIM))
+    assert len(tenant_indexes[1]) == 3
+    assert tenant_indexes[1].fingerprint == db.get_faq_fingerprint(1)